@@ -430,10 +430,7 @@ class CodeNavigationRequestHandler(AbstractRequestHandler):
         )
         if isinstance(response, code_navigation_request.ErrorResponse):
             return daemon_query.DaemonQueryFailure(response.message)
-        return [
-            definition_location.to_lsp_definition_response()
-            for definition_location in response.definitions
-        ]
+        return response.to_lsp_locations()
 
     async def get_reference_locations(
         self,
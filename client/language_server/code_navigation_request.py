@@ -11,33 +11,104 @@ server and gets a response.
 from __future__ import annotations
 
 import dataclasses
+import functools
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Type, TypeVar, Union
+from typing import Any, Callable, Dict, List, Optional, overload, Type, Union
 
-from .. import dataclasses_json_extensions as json_mixins
+from typing_extensions import Final
 
 from . import daemon_connection, protocol as lsp
 
 
+def _json_dumps(obj: object) -> bytes:
+    return json.dumps(obj).encode()
+
+
+_dumps: Callable[[object], bytes]
+_loads: Callable[[bytes], Any]
+# orjson is an optional dependency: it is used when installed, and the standard
+# library `json` module is used otherwise.
+try:
+    # pyre-fixme[21]: Could not find module `orjson`.
+    import orjson
+
+    def _orjson_dumps(obj: object) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            # orjson rejects strings with lone surrogates, which `json` escapes.
+            # They come from non-UTF-8 file names and from editor contents.
+            return _json_dumps(obj)
+
+    def _orjson_loads(data: bytes) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Likewise, orjson rejects escaped lone surrogates that `json` accepts.
+            return json.loads(data)
+
+    _dumps = _orjson_dumps
+    _loads = _orjson_loads
+except ImportError:
+    _dumps = _json_dumps
+    _loads = json.loads
+
+
+# Fixed fragments of the raw JSON requests sent to the code navigation server.
+# Only the variable fields in between are encoded per request.
+_HOVER_PREFIX: Final[bytes] = b'["Query",["Hover",{"module":["OfPath",'
+_LOCATION_OF_DEFINITION_PREFIX: Final[bytes] = (
+    b'["Query",["LocationOfDefinition",{"module":["OfPath",'
+)
+_QUERY_OVERLAY_ID: Final[bytes] = b'],"overlay_id":'
+_QUERY_LINE: Final[bytes] = b',"position":{"line":'
+_QUERY_COLUMN: Final[bytes] = b',"column":'
+_QUERY_SUFFIX: Final[bytes] = b"}}]]"
+_LOCAL_UPDATE_PREFIX: Final[bytes] = b'["Command",["LocalUpdate",{"module":["OfPath",'
+_LOCAL_UPDATE_CONTENT: Final[bytes] = b'],"content":'
+_FILE_OPENED_PREFIX: Final[bytes] = b'["Command",["FileOpened",{"path":'
+_FILE_CLOSED_PREFIX: Final[bytes] = b'["Command",["FileClosed",{"path":'
+_COMMAND_CONTENT: Final[bytes] = b',"content":'
+_COMMAND_OVERLAY_ID: Final[bytes] = b',"overlay_id":'
+_COMMAND_SUFFIX: Final[bytes] = b"}]]"
+
+
+@functools.lru_cache(maxsize=64)
+def _dumps_overlay_id(overlay_id: Optional[str]) -> bytes:
+    # An editor session only uses a handful of distinct overlay ids, so cache
+    # their encoded form instead of escaping them for every request.
+    return _dumps(overlay_id)
+
+
+def _raw_position_query(
+    prefix: bytes, path: str, overlay_id: Optional[str], position: lsp.PyrePosition
+) -> bytes:
+    return b"".join(
+        (
+            prefix,
+            _dumps(path),
+            _QUERY_OVERLAY_ID,
+            _dumps_overlay_id(overlay_id),
+            _QUERY_LINE,
+            b"%d" % position.line,
+            _QUERY_COLUMN,
+            b"%d" % position.character,
+            _QUERY_SUFFIX,
+        )
+    )
+
+
 @dataclasses.dataclass(frozen=True)
 class HoverRequest:
     path: Path
     overlay_id: Optional[str]
     position: lsp.PyrePosition
 
-    def to_json(self) -> List[object]:
-        return [
-            "Hover",
-            {
-                "module": ["OfPath", f"{self.path}"],
-                "overlay_id": self.overlay_id,
-                "position": {
-                    "line": self.position.line,
-                    "column": self.position.character,
-                },
-            },
-        ]
+    def to_raw(self) -> bytes:
+        return _raw_position_query(
+            _HOVER_PREFIX, str(self.path), self.overlay_id, self.position
+        )
 
 
 @dataclasses.dataclass(frozen=True)
@@ -46,18 +117,13 @@ class LocationOfDefinitionRequest:
     overlay_id: Optional[str]
     position: lsp.PyrePosition
 
-    def to_json(self) -> List[object]:
-        return [
-            "LocationOfDefinition",
-            {
-                "module": ["OfPath", f"{self.path}"],
-                "overlay_id": self.overlay_id,
-                "position": {
-                    "line": self.position.line,
-                    "column": self.position.character,
-                },
-            },
-        ]
+    def to_raw(self) -> bytes:
+        return _raw_position_query(
+            _LOCATION_OF_DEFINITION_PREFIX,
+            str(self.path),
+            self.overlay_id,
+            self.position,
+        )
 
 
 @dataclasses.dataclass(frozen=True)
@@ -66,52 +132,56 @@ class ErrorResponse:
 
 
 @dataclasses.dataclass(frozen=True)
-class HoverContent(json_mixins.CamlCaseAndExcludeJsonMixin):
+class HoverContent:
     value: Optional[str]
     docstring: Optional[str] = None
 
 
 @dataclasses.dataclass(frozen=True)
-class HoverResponse(json_mixins.CamlCaseAndExcludeJsonMixin):
+class HoverResponse:
     contents: List[HoverContent]
 
 
 @dataclasses.dataclass(frozen=True)
-class CodeNavigationPosition(json_mixins.CamlCaseAndExcludeJsonMixin):
+class CodeNavigationPosition:
     """LSP uses 0-indexing for lines whereas Pyre uses 1-indexing."""
 
     line: int
     column: int
 
-    def to_lsp_position(self) -> lsp.LspPosition:
-        return lsp.LspPosition(self.line - 1, self.column)
-
 
 @dataclasses.dataclass(frozen=True)
-class CodeNavigationRange(json_mixins.CamlCaseAndExcludeJsonMixin):
+class CodeNavigationRange:
     start: CodeNavigationPosition
     stop: CodeNavigationPosition
 
-    def to_lsp_range(self) -> lsp.LspRange:
-        return lsp.LspRange(
-            start=self.start.to_lsp_position(),
-            end=self.stop.to_lsp_position(),
-        )
-
 
 @dataclasses.dataclass(frozen=True)
 class DefinitionResponse:
     path: str
     range: CodeNavigationRange
 
-    def to_lsp_definition_response(self) -> lsp.LspLocation:
-        return lsp.LspLocation(uri=self.path, range=self.range.to_lsp_range())
-
 
 @dataclasses.dataclass(frozen=True)
-class LocationOfDefinitionResponse(json_mixins.CamlCaseAndExcludeJsonMixin):
+class LocationOfDefinitionResponse:
     definitions: List[DefinitionResponse]
 
+    def to_lsp_locations(self) -> List[lsp.LspLocation]:
+        return [
+            lsp.LspLocation(
+                uri=definition.path,
+                range=lsp.LspRange(
+                    start=lsp.LspPosition(
+                        definition.range.start.line - 1, definition.range.start.column
+                    ),
+                    end=lsp.LspPosition(
+                        definition.range.stop.line - 1, definition.range.stop.column
+                    ),
+                ),
+            )
+            for definition in self.definitions
+        ]
+
 
 @dataclasses.dataclass(frozen=True)
 class LocalUpdate:
@@ -119,15 +189,18 @@ class LocalUpdate:
     content: str
     overlay_id: str
 
-    def to_json(self) -> List[object]:
-        return [
-            "LocalUpdate",
-            {
-                "module": ["OfPath", f"{self.path}"],
-                "content": self.content,
-                "overlay_id": self.overlay_id,
-            },
-        ]
+    def to_raw(self) -> bytes:
+        return b"".join(
+            (
+                _LOCAL_UPDATE_PREFIX,
+                _dumps(str(self.path)),
+                _LOCAL_UPDATE_CONTENT,
+                _dumps(self.content),
+                _COMMAND_OVERLAY_ID,
+                _dumps_overlay_id(self.overlay_id),
+                _COMMAND_SUFFIX,
+            )
+        )
 
 
 @dataclasses.dataclass(frozen=True)
@@ -136,15 +209,18 @@ class FileOpened:
     content: str
     overlay_id: str
 
-    def to_json(self) -> List[object]:
-        return [
-            "FileOpened",
-            {
-                "path": f"{self.path}",
-                "content": self.content,
-                "overlay_id": self.overlay_id,
-            },
-        ]
+    def to_raw(self) -> bytes:
+        return b"".join(
+            (
+                _FILE_OPENED_PREFIX,
+                _dumps(str(self.path)),
+                _COMMAND_CONTENT,
+                _dumps(self.content),
+                _COMMAND_OVERLAY_ID,
+                _dumps_overlay_id(self.overlay_id),
+                _COMMAND_SUFFIX,
+            )
+        )
 
 
 @dataclasses.dataclass(frozen=True)
@@ -152,115 +228,196 @@ class FileClosed:
     path: Path
     overlay_id: str
 
-    def to_json(self) -> List[object]:
-        return [
-            "FileClosed",
-            {
-                "path": f"{self.path}",
-                "overlay_id": self.overlay_id,
-            },
+    def to_raw(self) -> bytes:
+        return b"".join(
+            (
+                _FILE_CLOSED_PREFIX,
+                _dumps(str(self.path)),
+                _COMMAND_OVERLAY_ID,
+                _dumps_overlay_id(self.overlay_id),
+                _COMMAND_SUFFIX,
+            )
+        )
+
+
+def invalid_response(response: bytes) -> ErrorResponse:
+    decoded_response = response.decode(errors="replace")
+    return ErrorResponse(
+        message=f"Invalid response {decoded_response} to hover request."
+    )
+
+
+def _decode_hover_response(response: Dict[str, Any]) -> HoverResponse:
+    return HoverResponse(
+        contents=[
+            HoverContent(value=content.get("value"), docstring=content.get("docstring"))
+            for content in response["contents"]
         ]
+    )
 
 
-def invalid_response(response: str) -> ErrorResponse:
-    return ErrorResponse(message=f"Invalid response {response} to hover request.")
+def _decode_code_navigation_position(
+    position: Dict[str, Any],
+) -> CodeNavigationPosition:
+    return CodeNavigationPosition(line=position["line"], column=position["column"])
+
+
+def _decode_location_of_definition_response(
+    response: Dict[str, Any],
+) -> LocationOfDefinitionResponse:
+    return LocationOfDefinitionResponse(
+        definitions=[
+            DefinitionResponse(
+                path=definition["path"],
+                range=CodeNavigationRange(
+                    start=_decode_code_navigation_position(
+                        definition["range"]["start"]
+                    ),
+                    stop=_decode_code_navigation_position(definition["range"]["stop"]),
+                ),
+            )
+            for definition in response["definitions"]
+        ]
+    )
 
 
-ResponseKind = TypeVar("ResponseKind", bound=json_mixins.CamlCaseAndExcludeJsonMixin)
+# Decoders keyed by the tag the code navigation server puts in front of the
+# response payload.
+_RESPONSE_DECODERS: Final[
+    Dict[
+        str,
+        Callable[[Dict[str, Any]], Union[HoverResponse, LocationOfDefinitionResponse]],
+    ]
+] = {
+    "Hover": _decode_hover_response,
+    "LocationOfDefinition": _decode_location_of_definition_response,
+}
 
 
-def parse_response(
-    response: Dict[str, Any], response_type: Type[ResponseKind]
-) -> ResponseKind | ErrorResponse:
-    try:
-        return response_type.cached_schema().load(response)
-    except AssertionError as error:
+def _decode_response(
+    response: object, kind: str
+) -> Union[HoverResponse, LocationOfDefinitionResponse, ErrorResponse]:
+    if not isinstance(response, dict):
         return ErrorResponse(
-            message=f"Assertion error when parsing JSON into the response schema: {error}"
+            message=f"Expected a JSON object for {kind} response, "
+            f"got {type(response).__name__}"
         )
+    try:
+        return _RESPONSE_DECODERS[kind](response)
+    except (AttributeError, KeyError, TypeError) as error:
+        return ErrorResponse(message=f"Malformed {kind} response: {error!r}")
+
+
+@overload
+def parse_response(
+    response: Dict[str, Any], response_type: Type[HoverResponse]
+) -> Union[HoverResponse, ErrorResponse]:
+    ...
+
+
+@overload
+def parse_response(
+    response: Dict[str, Any], response_type: Type[LocationOfDefinitionResponse]
+) -> Union[LocationOfDefinitionResponse, ErrorResponse]:
+    ...
+
+
+def parse_response(
+    response: Dict[str, Any],
+    response_type: Union[Type[HoverResponse], Type[LocationOfDefinitionResponse]],
+) -> Union[HoverResponse, LocationOfDefinitionResponse, ErrorResponse]:
+    if response_type is HoverResponse:
+        return _decode_response(response, "Hover")
+    return _decode_response(response, "LocationOfDefinition")
 
 
 def parse_raw_response(
-    raw_response: str, expected_response_kind: str, response_type: Type[ResponseKind]
-) -> ResponseKind | ErrorResponse:
+    raw_response: bytes,
+) -> Union[HoverResponse, LocationOfDefinitionResponse, ErrorResponse]:
     try:
-        response = json.loads(raw_response)
+        response = _loads(raw_response)
         if (
             not isinstance(response, list)
             or len(response) != 2
-            or response[0] != expected_response_kind
+            or not isinstance(response[0], str)
+            or response[0] not in _RESPONSE_DECODERS
         ):
             return invalid_response(raw_response)
     except Exception as error:
         return ErrorResponse(message=f"Exception while parsing response: {error}")
-    return parse_response(response[1], response_type)
+    return _decode_response(response[1], response[0])
 
 
 async def async_handle_hover_request(
     socket_path: Path,
     hover_request: HoverRequest,
 ) -> Union[lsp.PyreHoverResponse, ErrorResponse]:
-    raw_request = json.dumps(["Query", hover_request.to_json()])
-    response = await daemon_connection.attempt_send_async_raw_request(
+    raw_request = hover_request.to_raw()
+    raw_response = await daemon_connection.attempt_send_async_raw_request_bytes(
         socket_path, raw_request
     )
-    if isinstance(response, daemon_connection.DaemonConnectionFailure):
-        return ErrorResponse(message=response.error_message)
-    response = parse_raw_response(
-        response, expected_response_kind="Hover", response_type=HoverResponse
-    )
+    if isinstance(raw_response, daemon_connection.DaemonConnectionFailure):
+        return ErrorResponse(message=raw_response.error_message)
+    response = parse_raw_response(raw_response)
     if isinstance(response, ErrorResponse):
         return response
-    types = [content.value for content in response.contents]
-    types = filter(lambda value: value is not None, types)
-    return lsp.PyreHoverResponse(
-        "\n".join(str(content.value) for content in response.contents),
-        "\n".join(str(content.docstring) for content in response.contents),
-    )
+    if not isinstance(response, HoverResponse):
+        return invalid_response(raw_response)
+    values: List[str] = []
+    docstrings: List[str] = []
+    for content in response.contents:
+        values.append("" if content.value is None else str(content.value))
+        docstrings.append("" if content.docstring is None else str(content.docstring))
+    return lsp.PyreHoverResponse("\n".join(values), "\n".join(docstrings))
 
 
 async def async_handle_definition_request(
     socket_path: Path,
     definition_request: LocationOfDefinitionRequest,
 ) -> Union[LocationOfDefinitionResponse, ErrorResponse]:
-    raw_request = json.dumps(["Query", definition_request.to_json()])
-    response = await daemon_connection.attempt_send_async_raw_request(
+    raw_request = definition_request.to_raw()
+    raw_response = await daemon_connection.attempt_send_async_raw_request_bytes(
         socket_path, raw_request
     )
-    if isinstance(response, daemon_connection.DaemonConnectionFailure):
-        return ErrorResponse(message=response.error_message)
-    return parse_raw_response(
-        response,
-        expected_response_kind="LocationOfDefinition",
-        response_type=LocationOfDefinitionResponse,
+    if isinstance(raw_response, daemon_connection.DaemonConnectionFailure):
+        return ErrorResponse(message=raw_response.error_message)
+    response = parse_raw_response(raw_response)
+    if isinstance(response, ErrorResponse) or isinstance(
+        response, LocationOfDefinitionResponse
+    ):
+        return response
+    return invalid_response(raw_response)
+
+
+# The code navigation server reads exactly one request per connection and has
+# no batch query, so neither queries nor commands can be batched into a single
+# write. Bursts of edits are instead coalesced by the language server, which
+# only sends a `LocalUpdate` with the latest contents when a query needs an
+# up-to-date overlay.
+async def _async_send_command(
+    socket_path: Path, command: Union[LocalUpdate, FileOpened, FileClosed]
+) -> str | daemon_connection.DaemonConnectionFailure:
+    response = await daemon_connection.attempt_send_async_raw_request_bytes(
+        socket_path, command.to_raw()
     )
+    if isinstance(response, daemon_connection.DaemonConnectionFailure):
+        return response
+    return response.decode(errors="replace")
 
 
 async def async_handle_local_update(
     socket_path: Path, local_update: LocalUpdate
 ) -> str | daemon_connection.DaemonConnectionFailure:
-    raw_command = json.dumps(["Command", local_update.to_json()])
-    response = await daemon_connection.attempt_send_async_raw_request(
-        socket_path, raw_command
-    )
-    return response
+    return await _async_send_command(socket_path, local_update)
 
 
 async def async_handle_file_opened(
     socket_path: Path, file_opened: FileOpened
 ) -> str | daemon_connection.DaemonConnectionFailure:
-    raw_command = json.dumps(["Command", file_opened.to_json()])
-    response = await daemon_connection.attempt_send_async_raw_request(
-        socket_path, raw_command
-    )
-    return response
+    return await _async_send_command(socket_path, file_opened)
 
 
 async def async_handle_file_closed(
     socket_path: Path, file_closed: FileClosed
 ) -> str | daemon_connection.DaemonConnectionFailure:
-    raw_command = json.dumps(["Command", file_closed.to_json()])
-    response = await daemon_connection.attempt_send_async_raw_request(
-        socket_path, raw_command
-    )
-    return response
+    return await _async_send_command(socket_path, file_closed)
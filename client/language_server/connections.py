@@ -333,7 +333,7 @@ class StreamBytesWriter(AsyncBytesWriter):
 
 
 @contextlib.asynccontextmanager
-async def _connect_async_bytes(
+async def connect_async_bytes(
     socket_path: Path, buffer_size: Optional[int] = None
 ) -> AsyncIterator[Tuple[AsyncBytesReader, AsyncBytesWriter]]:
     """
@@ -383,7 +383,7 @@ async def connect_async(
     operates in text mode. Read/write APIs of the streams uses UTF-8 encoded
     `str` instead of `bytes`.
     """
-    async with _connect_async_bytes(socket_path, buffer_size) as (
+    async with connect_async_bytes(socket_path, buffer_size) as (
         bytes_reader,
         bytes_writer,
     ):
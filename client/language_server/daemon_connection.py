@@ -21,7 +21,7 @@ import contextlib
 import dataclasses
 import logging
 from pathlib import Path
-from typing import AsyncIterator, Union
+from typing import AsyncIterator, Tuple, Type, Union
 
 from .. import dataclasses_json_extensions as json_mixins, log
 from . import connections
@@ -85,6 +85,20 @@ async def send_async_raw_request(
         return await connection.send_request(request)
 
 
+_CONNECTION_ERRORS: Tuple[Type[Exception], ...] = (
+    connections.ConnectionFailure,
+    asyncio.IncompleteReadError,
+    ConnectionError,
+)
+
+
+def _connection_failure(socket_path: Path, error: Exception) -> DaemonConnectionFailure:
+    return DaemonConnectionFailure(
+        "Could not establish connection with an existing Pyre server "
+        f"at {socket_path}: {error}"
+    )
+
+
 async def attempt_send_async_raw_request(
     socket_path: Path,
     request: str,
@@ -94,12 +108,46 @@ async def attempt_send_async_raw_request(
             socket_path,
             request,
         )
-    except (
-        connections.ConnectionFailure,
-        asyncio.IncompleteReadError,
-        ConnectionError,
-    ) as error:
-        return DaemonConnectionFailure(
-            "Could not establish connection with an existing Pyre server "
-            f"at {socket_path}: {error}"
+    except _CONNECTION_ERRORS as error:
+        return _connection_failure(socket_path, error)
+
+
+def _truncate_bytes(message: bytes, size: int) -> str:
+    # Only decode the bytes that are logged: requests carry whole file contents.
+    if len(message) <= size:
+        return message.decode(errors="replace")
+    return (
+        f"{message[:size].decode(errors='replace')}"
+        f"..[truncated {len(message) - size} bytes]"
+    )
+
+
+async def send_async_raw_request_bytes(
+    socket_path: Path,
+    request: bytes,
+) -> bytes:
+    """
+    Same as `send_async_raw_request`, but sends and receives UTF-8 encoded bytes
+    directly instead of going through the text-mode connection.
+    """
+    async with connections.connect_async_bytes(socket_path) as (reader, writer):
+        LOG.debug(f"Sending `{_truncate_bytes(request, 400)}`")
+        # Write the separator on its own so that the payload is not copied.
+        await writer.write(request)
+        await writer.write(b"\n")
+        response = await reader.read_until(separator=b"\n")
+        LOG.info(f"Received: `{_truncate_bytes(response, 400)}`")
+        return response
+
+
+async def attempt_send_async_raw_request_bytes(
+    socket_path: Path,
+    request: bytes,
+) -> Union[DaemonConnectionFailure, bytes]:
+    try:
+        return await send_async_raw_request_bytes(
+            socket_path,
+            request,
         )
+    except _CONNECTION_ERRORS as error:
+        return _connection_failure(socket_path, error)
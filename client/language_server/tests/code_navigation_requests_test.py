@@ -4,12 +4,16 @@
 # LICENSE file in the root directory of this source tree.
 
 
+import copy
 import json
+import os
+import pickle
 from pathlib import Path
 
 import testslide
 
-from .. import code_navigation_request, protocol as lsp
+from ...tests import setup
+from .. import code_navigation_request, daemon_connection, protocol as lsp
 
 
 class CodeNavigationRequestsTest(testslide.TestCase):
@@ -20,14 +24,17 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             position=lsp.PyrePosition(line=1, character=2),
         )
         self.assertEqual(
-            hover_request.to_json(),
+            json.loads(hover_request.to_raw()),
             [
-                "Hover",
-                {
-                    "module": ["OfPath", "/a/b.py"],
-                    "overlay_id": None,
-                    "position": {"line": 1, "column": 2},
-                },
+                "Query",
+                [
+                    "Hover",
+                    {
+                        "module": ["OfPath", "/a/b.py"],
+                        "overlay_id": None,
+                        "position": {"line": 1, "column": 2},
+                    },
+                ],
             ],
         )
 
@@ -37,14 +44,17 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             position=lsp.PyrePosition(line=1, character=2),
         )
         self.assertEqual(
-            hover_request.to_json(),
+            json.loads(hover_request.to_raw()),
             [
-                "Hover",
-                {
-                    "module": ["OfPath", "/a/b.py"],
-                    "overlay_id": "overlay_key",
-                    "position": {"line": 1, "column": 2},
-                },
+                "Query",
+                [
+                    "Hover",
+                    {
+                        "module": ["OfPath", "/a/b.py"],
+                        "overlay_id": "overlay_key",
+                        "position": {"line": 1, "column": 2},
+                    },
+                ],
             ],
         )
         definition_request = code_navigation_request.LocationOfDefinitionRequest(
@@ -53,16 +63,137 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             position=lsp.PyrePosition(line=1, character=2),
         )
         self.assertEqual(
-            definition_request.to_json(),
+            json.loads(definition_request.to_raw()),
+            [
+                "Query",
+                [
+                    "LocationOfDefinition",
+                    {
+                        "module": ["OfPath", "/a/b.py"],
+                        "overlay_id": "overlay_key",
+                        "position": {"line": 1, "column": 2},
+                    },
+                ],
+            ],
+        )
+
+    def test_serialize_request_escaping(self) -> None:
+        path = Path('/a/"b".py')
+        content = 'def foo() -> str: return "\\n"\n'
+        local_update = code_navigation_request.LocalUpdate(
+            path=path, content=content, overlay_id="/a/b.py 1234"
+        )
+        self.assertEqual(
+            json.loads(local_update.to_raw()),
+            [
+                "Command",
+                [
+                    "LocalUpdate",
+                    {
+                        "module": ["OfPath", '/a/"b".py'],
+                        "content": content,
+                        "overlay_id": "/a/b.py 1234",
+                    },
+                ],
+            ],
+        )
+        file_opened = code_navigation_request.FileOpened(
+            path=path, content=content, overlay_id="/a/b.py 1234"
+        )
+        self.assertEqual(
+            json.loads(file_opened.to_raw()),
+            [
+                "Command",
+                [
+                    "FileOpened",
+                    {
+                        "path": '/a/"b".py',
+                        "content": content,
+                        "overlay_id": "/a/b.py 1234",
+                    },
+                ],
+            ],
+        )
+        file_closed = code_navigation_request.FileClosed(
+            path=path, overlay_id="/a/b.py 1234"
+        )
+        self.assertEqual(
+            json.loads(file_closed.to_raw()),
+            [
+                "Command",
+                ["FileClosed", {"path": '/a/"b".py', "overlay_id": "/a/b.py 1234"}],
+            ],
+        )
+
+    def test_serialize_raw_request_with_surrogates(self) -> None:
+        # A file name that is not valid UTF-8 decodes to a lone surrogate.
+        path = Path(os.fsdecode(b"/tmp/caf\xe9.py"))
+        hover_request = code_navigation_request.HoverRequest(
+            path=path,
+            overlay_id=None,
+            position=lsp.PyrePosition(line=1, character=2),
+        )
+        self.assertEqual(
+            json.loads(hover_request.to_raw())[1][1]["module"],
+            ["OfPath", "/tmp/caf\udce9.py"],
+        )
+        local_update = code_navigation_request.LocalUpdate(
+            path=path,
+            content="x = '\ud83d'",
+            overlay_id="overlay_key",
+        )
+        self.assertEqual(
+            json.loads(local_update.to_raw())[1][1]["content"],
+            "x = '\ud83d'",
+        )
+
+    def test_parse_raw_response_with_surrogates(self) -> None:
+        raw_response = json.dumps(
             [
                 "LocationOfDefinition",
                 {
-                    "module": ["OfPath", "/a/b.py"],
-                    "overlay_id": "overlay_key",
-                    "position": {"line": 1, "column": 2},
+                    "definitions": [
+                        {
+                            "path": "/tmp/caf\udce9.py",
+                            "range": {
+                                "start": {"line": 1, "column": 2},
+                                "stop": {"line": 1, "column": 3},
+                            },
+                        }
+                    ]
                 },
-            ],
+            ]
+        ).encode()
+        self.assertEqual(
+            code_navigation_request.parse_raw_response(raw_response),
+            code_navigation_request.LocationOfDefinitionResponse(
+                definitions=[
+                    code_navigation_request.DefinitionResponse(
+                        path="/tmp/caf\udce9.py",
+                        range=code_navigation_request.CodeNavigationRange(
+                            start=code_navigation_request.CodeNavigationPosition(
+                                line=1, column=2
+                            ),
+                            stop=code_navigation_request.CodeNavigationPosition(
+                                line=1, column=3
+                            ),
+                        ),
+                    )
+                ]
+            ),
+        )
+
+    def test_copy_and_pickle(self) -> None:
+        hover_request = code_navigation_request.HoverRequest(
+            path=Path("/a/b.py"),
+            overlay_id="overlay_key",
+            position=lsp.PyrePosition(line=1, character=2),
         )
+        error_response = code_navigation_request.ErrorResponse(message="error")
+        for value in [hover_request, error_response]:
+            self.assertEqual(copy.copy(value), value)
+            self.assertEqual(copy.deepcopy(value), value)
+            self.assertEqual(pickle.loads(pickle.dumps(value)), value)
 
     def test_parse_raw_response(self) -> None:
         raw_response = json.dumps(
@@ -72,11 +203,7 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             ]
         )
         self.assertEqual(
-            code_navigation_request.parse_raw_response(
-                raw_response,
-                expected_response_kind="Hover",
-                response_type=code_navigation_request.HoverResponse,
-            ),
+            code_navigation_request.parse_raw_response(raw_response.encode()),
             code_navigation_request.ErrorResponse(
                 f"Invalid response {raw_response} to hover request."
             ),
@@ -91,16 +218,65 @@ class CodeNavigationRequestsTest(testslide.TestCase):
         )
 
         self.assertEqual(
-            code_navigation_request.parse_raw_response(
-                raw_response,
-                expected_response_kind="Hover",
-                response_type=code_navigation_request.HoverResponse,
-            ),
+            code_navigation_request.parse_raw_response(raw_response.encode()),
             code_navigation_request.ErrorResponse(
                 f"Invalid response {raw_response} to hover request."
             ),
         )
 
+        raw_response = '["Hover",{"contents":[{"value":"int"}]}]\n'
+        self.assertEqual(
+            code_navigation_request.parse_raw_response(raw_response.encode()),
+            code_navigation_request.HoverResponse(
+                contents=[code_navigation_request.HoverContent(value="int")]
+            ),
+        )
+
+        raw_response = json.dumps(["Hover", ["NotAnObject"]])
+        self.assertEqual(
+            code_navigation_request.parse_raw_response(raw_response.encode()),
+            code_navigation_request.parse_response(
+                # pyre-ignore[6]: Deliberately passing a malformed payload.
+                ["NotAnObject"],
+                response_type=code_navigation_request.HoverResponse,
+            ),
+        )
+
+        raw_response = json.dumps(
+            [
+                "LocationOfDefinition",
+                {
+                    "definitions": [
+                        {
+                            "path": "/a/b.py",
+                            "range": {
+                                "start": {"line": 1, "column": 2},
+                                "stop": {"line": 1, "column": 6},
+                            },
+                        }
+                    ]
+                },
+            ]
+        )
+        self.assertEqual(
+            code_navigation_request.parse_raw_response(raw_response.encode()),
+            code_navigation_request.LocationOfDefinitionResponse(
+                definitions=[
+                    code_navigation_request.DefinitionResponse(
+                        path="/a/b.py",
+                        range=code_navigation_request.CodeNavigationRange(
+                            code_navigation_request.CodeNavigationPosition(
+                                line=1, column=2
+                            ),
+                            code_navigation_request.CodeNavigationPosition(
+                                line=1, column=6
+                            ),
+                        ),
+                    )
+                ]
+            ),
+        )
+
     def test_hover_response(self) -> None:
         response = {"contents": [{"value": "int", "docstring": "test docstring"}]}
         self.assertEqual(
@@ -116,8 +292,8 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             ),
         )
 
-        # Note that there's a type error here in the TypedDict, but we happily parse it in our json_mixins, even
-        # with the cached_schema().
+        # Note that there's a type error here in the TypedDict, but we happily parse it
+        # since the response decoders do not validate field types.
         response = {"contents": [{"value": 32, "docstring": None}]}
         self.assertEqual(
             code_navigation_request.parse_response(
@@ -165,6 +341,88 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             ),
         )
 
+    def test_definition_response_to_lsp(self) -> None:
+        response = code_navigation_request.LocationOfDefinitionResponse(
+            definitions=[
+                code_navigation_request.DefinitionResponse(
+                    path="/a/b.py",
+                    range=code_navigation_request.CodeNavigationRange(
+                        code_navigation_request.CodeNavigationPosition(
+                            line=1, column=2
+                        ),
+                        code_navigation_request.CodeNavigationPosition(
+                            line=3, column=6
+                        ),
+                    ),
+                ),
+                code_navigation_request.DefinitionResponse(
+                    path="/c/d.py",
+                    range=code_navigation_request.CodeNavigationRange(
+                        code_navigation_request.CodeNavigationPosition(
+                            line=5, column=0
+                        ),
+                        code_navigation_request.CodeNavigationPosition(
+                            line=5, column=4
+                        ),
+                    ),
+                ),
+            ]
+        )
+        self.assertEqual(
+            response.to_lsp_locations(),
+            [
+                lsp.LspLocation(
+                    uri="/a/b.py",
+                    range=lsp.LspRange(
+                        start=lsp.LspPosition(line=0, character=2),
+                        end=lsp.LspPosition(line=2, character=6),
+                    ),
+                ),
+                lsp.LspLocation(
+                    uri="/c/d.py",
+                    range=lsp.LspRange(
+                        start=lsp.LspPosition(line=4, character=0),
+                        end=lsp.LspPosition(line=4, character=4),
+                    ),
+                ),
+            ],
+        )
+
+    def test_malformed_response(self) -> None:
+        self.assertEqual(
+            code_navigation_request.parse_response(
+                {"contents": [{"value": "int"}]},
+                response_type=code_navigation_request.HoverResponse,
+            ),
+            code_navigation_request.HoverResponse(
+                contents=[code_navigation_request.HoverContent(value="int")]
+            ),
+        )
+        self.assertIsInstance(
+            code_navigation_request.parse_response(
+                {"no_contents": []},
+                response_type=code_navigation_request.HoverResponse,
+            ),
+            code_navigation_request.ErrorResponse,
+        )
+        self.assertEqual(
+            code_navigation_request.parse_response(
+                # pyre-ignore[6]: Deliberately passing a malformed payload.
+                ["NotAnObject"],
+                response_type=code_navigation_request.HoverResponse,
+            ),
+            code_navigation_request.ErrorResponse(
+                "Expected a JSON object for Hover response, got list"
+            ),
+        )
+        self.assertIsInstance(
+            code_navigation_request.parse_response(
+                {"definitions": [{"path": "/a/b.py", "range": {"start": {}}}]},
+                response_type=code_navigation_request.LocationOfDefinitionResponse,
+            ),
+            code_navigation_request.ErrorResponse,
+        )
+
     def test_local_update_json(self) -> None:
         local_update = code_navigation_request.LocalUpdate(
             path=Path("/a/b.py"),
@@ -172,14 +430,17 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             overlay_id="/a/b.py 1234",
         )
         self.assertEqual(
-            local_update.to_json(),
+            json.loads(local_update.to_raw()),
             [
-                "LocalUpdate",
-                {
-                    "module": ["OfPath", "/a/b.py"],
-                    "content": "def foo() -> int: pass\n",
-                    "overlay_id": "/a/b.py 1234",
-                },
+                "Command",
+                [
+                    "LocalUpdate",
+                    {
+                        "module": ["OfPath", "/a/b.py"],
+                        "content": "def foo() -> int: pass\n",
+                        "overlay_id": "/a/b.py 1234",
+                    },
+                ],
             ],
         )
 
@@ -190,14 +451,17 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             overlay_id="/a/b.py 1234",
         )
         self.assertEqual(
-            local_update.to_json(),
+            json.loads(local_update.to_raw()),
             [
-                "FileOpened",
-                {
-                    "path": "/a/b.py",
-                    "content": "def foo() -> int: pass\n",
-                    "overlay_id": "/a/b.py 1234",
-                },
+                "Command",
+                [
+                    "FileOpened",
+                    {
+                        "path": "/a/b.py",
+                        "content": "def foo() -> int: pass\n",
+                        "overlay_id": "/a/b.py 1234",
+                    },
+                ],
             ],
         )
 
@@ -207,12 +471,53 @@ class CodeNavigationRequestsTest(testslide.TestCase):
             overlay_id="/a/b.py 1234",
         )
         self.assertEqual(
-            local_update.to_json(),
+            json.loads(local_update.to_raw()),
             [
-                "FileClosed",
+                "Command",
+                [
+                    "FileClosed",
+                    {
+                        "path": "/a/b.py",
+                        "overlay_id": "/a/b.py 1234",
+                    },
+                ],
+            ],
+        )
+
+    @setup.async_test
+    async def test_handle_hover_request(self) -> None:
+        hover_request = code_navigation_request.HoverRequest(
+            path=Path("/a/b.py"),
+            overlay_id=None,
+            position=lsp.PyrePosition(line=1, character=2),
+        )
+        hover_response = json.dumps(
+            [
+                "Hover",
                 {
-                    "path": "/a/b.py",
-                    "overlay_id": "/a/b.py 1234",
+                    "contents": [
+                        {"value": "int", "docstring": None},
+                        {"value": None, "docstring": "Some docstring."},
+                    ]
                 },
-            ],
+            ]
+        ).encode()
+        definition_response = b'["LocationOfDefinition",{"definitions":[]}]'
+        self.mock_async_callable(
+            daemon_connection, "attempt_send_async_raw_request_bytes"
+        ).to_return_values([hover_response, definition_response])
+        self.assertEqual(
+            await code_navigation_request.async_handle_hover_request(
+                Path("dummy"), hover_request
+            ),
+            lsp.PyreHoverResponse(value="int\n", docstring="\nSome docstring."),
+        )
+        self.assertEqual(
+            await code_navigation_request.async_handle_hover_request(
+                Path("dummy"), hover_request
+            ),
+            code_navigation_request.ErrorResponse(
+                message=f"Invalid response {definition_response.decode()} "
+                "to hover request."
+            ),
         )
@@ -13,7 +13,11 @@ import testslide
 from ...tests import setup
 
 from .. import connections
-from ..daemon_connection import attempt_send_async_raw_request, DaemonConnectionFailure
+from ..daemon_connection import (
+    attempt_send_async_raw_request,
+    attempt_send_async_raw_request_bytes,
+    DaemonConnectionFailure,
+)
 
 T = TypeVar("T")
 
@@ -69,6 +73,43 @@ class SendTest(testslide.TestCase):
             "derp\n",
         )
 
+    @setup.async_test
+    async def test_attempt_send_async_raw_request_bytes_ok(self) -> None:
+        bytes_writer = connections.MemoryBytesWriter()
+        self.mock_callable(
+            connections,
+            "connect_async_bytes",
+            type_validation=False,
+        ).to_return_value(
+            MockAsyncContextManager(
+                (connections.MemoryBytesReader(b"derp\n"), bytes_writer)
+            )
+        )
+        self.assertEqual(
+            await attempt_send_async_raw_request_bytes(Path("dummy"), b"dummy_request"),
+            b"derp\n",
+        )
+        self.assertEqual(bytes_writer.items(), [b"dummy_request", b"\n"])
+
+    @setup.async_test
+    async def test_attempt_send_async_raw_request_bytes_failure(self) -> None:
+        self.mock_callable(
+            connections,
+            "connect_async_bytes",
+            type_validation=False,
+        ).to_return_value(
+            MockAsyncContextManager(
+                (
+                    RaisingBytesReader(ConnectionResetError()),
+                    connections.MemoryBytesWriter(),
+                )
+            )
+        )
+        result = await attempt_send_async_raw_request_bytes(
+            Path("dummy"), b"dummy_request"
+        )
+        self.assertTrue(isinstance(result, DaemonConnectionFailure))
+
     @setup.async_test
     async def test_attempt_send_async_raw_request_failure0(self) -> None:
         self.mock_callable(